@@ -1,12 +1,17 @@
-from fastapi import APIRouter, File, UploadFile, Form, HTTPException
-from typing import List
-import json
+from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import List, Dict, Any, AsyncIterator
+import logging
+import orjson
 import time  # NEW: Import time module
-from app.services.log_analyzer import LogAnalyzer
 from app.models import AnalysisResponse, HealthResponse
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Read uploads in 1MB chunks
+
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
-analyzer = LogAnalyzer()
 
 
 @router.get("/", response_model=dict)
@@ -22,6 +27,7 @@ async def health_check():
 
 @router.post("/analyze-logs", response_model=AnalysisResponse)
 async def analyze_logs(
+        request: Request,
         file: UploadFile = File(..., description="JSONL log file (one JSON object per line)"),
         prompt: str = Form(..., description="Incident description or query")
 ):
@@ -39,69 +45,193 @@ async def analyze_logs(
             raise HTTPException(status_code=400, detail="No valid log entries found")
 
         # Analyze logs
-        result = await analyzer.analyze_logs(logs, prompt)
-
-        # Calculate total processing time
-        processing_time = time.time() - start_time  # NEW: Calculate elapsed time
-
-        return AnalysisResponse(
-            prompt=prompt,
-            total_logs=result["total_logs"],
-            filtered_logs_count=result["filtered_logs_count"],
-            analysis=result["analysis"],
-            embedding_cost_usd=result["embedding_cost_usd"],
-            llm_cost_usd=result["llm_cost_usd"],
-            total_cost_usd=result["total_cost_usd"],
-            processing_time_seconds=round(processing_time, 3),  # NEW: Add processing time
-            top_filtered_logs=result["top_filtered_logs"],
-            timing_breakdown=result["timing_breakdown"],
-            success=True
-        )
+        result = await request.app.state.analyzer.analyze_logs(logs, prompt)
+
+        return ORJSONResponse(content=_build_response(prompt, result, start_time))
 
     except HTTPException:
         raise
     except Exception as e:
         # Still capture timing even for errors (optional)
         processing_time = time.time() - start_time
-        print(f"Error occurred after {processing_time:.3f} seconds: {str(e)}")
+        logger.error("Error occurred after %.3f seconds: %s", processing_time, e)
         raise HTTPException(status_code=500, detail=f"Error processing logs: {str(e)}")
 
 
+@router.post("/analyze-logs/stream", response_class=StreamingResponse)
+async def analyze_logs_stream(
+        request: Request,
+        file: UploadFile = File(..., description="JSONL log file (one JSON object per line)"),
+        prompt: str = Form(..., description="Incident description or query")
+):
+    """
+    Same analysis as /analyze-logs, streamed as Server-Sent Events.
+    Emits a `delta` event for each chunk of LLM output as it is generated, then a final
+    `result` event with the full AnalysisResponse (or an `error` event if analysis fails).
+    """
+    start_time = time.time()
+
+    # Parse uploaded logs up front so bad uploads still get a regular 400 response
+    logs = await _parse_log_file(file)
+
+    if not logs:
+        raise HTTPException(status_code=400, detail="No valid log entries found")
+
+    events = request.app.state.analyzer.analyze_logs_stream(logs, prompt)
+    return StreamingResponse(_stream_events(events, prompt, start_time), media_type="text/event-stream")
+
+
+def _build_response(prompt: str, result: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+    """Build the AnalysisResponse body from the analyzer result"""
+    # Calculate total processing time
+    processing_time = time.time() - start_time  # NEW: Calculate elapsed time
+
+    # Logs were parsed by us, so skip re-validating them in the response model
+    response = AnalysisResponse.model_construct(
+        prompt=prompt,
+        total_logs=result["total_logs"],
+        filtered_logs_count=result["filtered_logs_count"],
+        analysis=result["analysis"],
+        embedding_cost_usd=result["embedding_cost_usd"],
+        llm_cost_usd=result["llm_cost_usd"],
+        total_cost_usd=result["total_cost_usd"],
+        processing_time_seconds=round(processing_time, 3),  # NEW: Add processing time
+        top_filtered_logs=result["top_filtered_logs"],
+        timing_breakdown=result["timing_breakdown"],
+        success=True
+    )
+    return response.model_dump()
+
+
+async def _stream_events(
+        events: AsyncIterator[Dict[str, Any]],
+        prompt: str,
+        start_time: float
+) -> AsyncIterator[bytes]:
+    """Format analyzer events as Server-Sent Events"""
+    try:
+        async for event in events:
+            if "delta" in event:
+                yield _format_sse("delta", event)
+            else:
+                yield _format_sse("result", _build_response(prompt, event["result"], start_time))
+
+    # The response has already started, so errors are reported as an event instead of a status code
+    except HTTPException as e:
+        yield _format_sse("error", {"detail": e.detail})
+    except Exception as e:
+        processing_time = time.time() - start_time
+        logger.error("Error occurred after %.3f seconds: %s", processing_time, e)
+        yield _format_sse("error", {"detail": f"Error processing logs: {str(e)}"})
+
+
+def _format_sse(event: str, data: Dict[str, Any]) -> bytes:
+    """Encode a single Server-Sent Event"""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
 async def _parse_log_file(file: UploadFile) -> List[dict]:
-    """Parse uploaded JSONL (JSON Lines) log file"""
-    content = await file.read()
+    """Parse uploaded JSONL (JSON Lines) log file.
+
+    Lines are parsed straight from bytes; orjson validates UTF-8 itself, so
+    lines with a bad encoding are skipped like any other malformed line.
+    Unlike the stdlib json module, orjson rejects NaN/Infinity, so lines containing
+    them are skipped too, and it reads integers wider than 64 bits as (lossy) floats.
+    """
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+    # Regular JSON documents (array or single object) must be parsed as a whole.
+    # Arrays are also recognized by their first byte, since uploads often carry a generic content type.
+    if _is_json_document(file) or chunk.lstrip().startswith(b'['):
+        content = chunk + await file.read()
+        logs = await _parse_json_document(content)
+        if not logs:
+            # JSONL exports are often named .json or sent as application/json
+            await run_in_threadpool(_parse_log_lines, content.split(b'\n'), 0, logs)
+        return logs
+
+    # A JSONL file's first line is a complete object; if it isn't, the upload may be a
+    # pretty-printed JSON object, so keep it around to parse as a whole at the end
+    retained = [] if _may_be_json_object(chunk) else None
     logs = []
+    buffer = bytearray()
+    line_num = 0
+
+    # Stream the upload in chunks so memory stays flat regardless of file size
+    while chunk:
+        if retained is not None:
+            retained.append(chunk)
+
+        buffer.extend(chunk)
+        lines = buffer.split(b'\n')
+        buffer = lines.pop()  # Keep the trailing partial line for the next chunk
+
+        # Parse in a worker thread so the event loop keeps serving other requests during large uploads
+        await run_in_threadpool(_parse_log_lines, lines, line_num, logs)
+        line_num += len(lines)
+
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+
+    # Flush the last line if the file doesn't end with a newline
+    _parse_log_line(buffer, line_num + 1, logs)
+
+    # A pretty-printed JSON object with a generic name/content type isn't valid JSONL
+    # (though some of its lines may parse on their own), so prefer the whole document
+    if retained:
+        document_logs = await _parse_json_document(b''.join(retained))
+        if document_logs:
+            return document_logs
+
+    return logs
+
+
+def _parse_log_lines(lines: List[bytes], last_line_num: int, logs: List[dict]) -> None:
+    """Parse a chunk of JSONL lines following line number last_line_num and append them to logs"""
+    for line_num, line in enumerate(lines, last_line_num + 1):
+        _parse_log_line(line, line_num, logs)
+
+
+def _parse_log_line(line: bytes, line_num: int, logs: List[dict]) -> None:
+    """Parse a single JSONL line and append it to logs"""
+    line = line.strip()
+    if not line:  # Skip empty lines
+        return
 
     try:
-        # Decode content and split by lines
-        text_content = content.decode('utf-8').strip()
-
-        # Handle JSONL format (one JSON object per line)
-        for line_num, line in enumerate(text_content.split('\n'), 1):
-            line = line.strip()
-            if not line:  # Skip empty lines
-                continue
-
-            try:
-                log_entry = json.loads(line)
-                logs.append(log_entry)
-            except json.JSONDecodeError as e:
-                # Log the error but continue processing other lines
-                print(f"Warning: Failed to parse line {line_num}: {e}")
-                continue
-
-        # Fallback: try parsing as regular JSON array if JSONL parsing yielded no results
-        if not logs:
-            try:
-                parsed = json.loads(text_content)
-                if isinstance(parsed, list):
-                    logs = parsed
-                elif isinstance(parsed, dict):
-                    logs = [parsed]
-            except json.JSONDecodeError:
-                pass
-
-    except UnicodeDecodeError:
-        raise HTTPException(status_code=400, detail="File encoding not supported. Please use UTF-8 encoded files.")
-
-    return logs
\ No newline at end of file
+        logs.append(orjson.loads(line))
+    except orjson.JSONDecodeError as e:
+        # Skip the line and continue processing (debug level, so bad lines don't cost I/O in production)
+        logger.debug("Failed to parse line %d: %s", line_num, e)
+
+
+def _may_be_json_object(chunk: bytes) -> bool:
+    """Check whether the upload starts like a JSON object whose first line isn't a complete JSONL entry"""
+    first_line = chunk.lstrip().split(b'\n', 1)[0]
+    if not first_line.startswith(b'{'):
+        return False
+    try:
+        orjson.loads(first_line)
+    except orjson.JSONDecodeError:
+        return True
+    return False
+
+
+def _is_json_document(file: UploadFile) -> bool:
+    """Check whether the upload is a regular JSON document rather than JSONL"""
+    if file.content_type == "application/json":
+        return True
+    return (file.filename or "").lower().endswith(".json")
+
+
+async def _parse_json_document(content: bytes) -> List[dict]:
+    """Parse uploaded JSON file content containing an array of logs or a single log object"""
+    try:
+        parsed = await run_in_threadpool(orjson.loads, content)
+    except orjson.JSONDecodeError:
+        return []
+
+    if isinstance(parsed, list):
+        return parsed
+    elif isinstance(parsed, dict):
+        return [parsed]
+    return []
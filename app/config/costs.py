@@ -4,7 +4,10 @@ All pricing is per 1,000 tokens and based on OpenAI's official pricing.
 Last updated: September 2025 - Based on official OpenAI documentation
 """
 
-from typing import Dict
+from typing import Dict, Iterable
+
+# OpenAI's rule of thumb: ~4 characters per token for English text
+CHARS_PER_TOKEN = 4
 
 
 class ModelCosts:
@@ -56,6 +59,13 @@ class ModelCosts:
         }
     }
 
+    # Per-token rates precomputed once, so cost calculations need a single lookup
+    _EMBEDDING_COST_PER_TOKEN = {model: cost / 1000 for model, cost in EMBEDDING_COSTS.items()}
+    _CHAT_COMPLETION_COST_PER_TOKEN = {
+        model: (costs["input"] / 1000, costs["output"] / 1000)
+        for model, costs in CHAT_COMPLETION_COSTS.items()
+    }
+
     @classmethod
     def get_embedding_cost(cls, model: str) -> float:
         """Get cost per 1K tokens for embedding model"""
@@ -69,30 +79,30 @@ class ModelCosts:
     @classmethod
     def calculate_embedding_cost(cls, model: str, token_count: int) -> float:
         """Calculate total embedding cost"""
-        cost_per_1k = cls.get_embedding_cost(model)
-        return (token_count * cost_per_1k) / 1000
+        return token_count * cls._EMBEDDING_COST_PER_TOKEN.get(model, 0.0)
 
     @classmethod
     def calculate_chat_completion_cost(cls, model: str, input_tokens: int, output_tokens: int) -> float:
         """Calculate total chat completion cost"""
-        costs = cls.get_chat_completion_cost(model)
-        input_cost = (input_tokens * costs["input"]) / 1000
-        output_cost = (output_tokens * costs["output"]) / 1000
-        return input_cost + output_cost
+        input_rate, output_rate = cls._CHAT_COMPLETION_COST_PER_TOKEN.get(model, (0.0, 0.0))
+        return input_tokens * input_rate + output_tokens * output_rate
 
     @classmethod
     def estimate_token_count(cls, text: str) -> int:
         """
         Estimate token count for text.
 
-        OpenAI's rule: ~1 token per 0.75 words
-        Therefore: 1 word ≈ 1/0.75 = 1.33 tokens
+        OpenAI's rule: ~1 token per 4 characters of English text.
+        Only needs len(), so no per-word list is allocated.
 
         For more accuracy, consider using tiktoken library in production.
         """
-        word_count = len(text.split())
-        # Convert words to tokens: words * (1 token / 0.75 words) = words / 0.75
-        return int(word_count / 0.75)  # Correct calculation: words ÷ 0.75
+        return len(text) // CHARS_PER_TOKEN
+
+    @classmethod
+    def estimate_batch_token_count(cls, texts: Iterable[str]) -> int:
+        """Estimate the total token count for a batch of texts in a single pass"""
+        return sum(map(len, texts)) // CHARS_PER_TOKEN
 
 
 # For convenience, create an instance
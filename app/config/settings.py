@@ -7,12 +7,21 @@ load_dotenv()
 
 class Settings(BaseSettings):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    openai_max_retries: int = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+    openai_timeout_seconds: float = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "30"))
     embedding_model: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
-    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "200"))
+    embedding_batch_size: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "2048"))  # OpenAI max inputs per request
+    # Estimated at 4 chars/token, but log text (UUIDs, hex IDs, timestamps) can be ~2 chars/token,
+    # so 100K estimated tokens stays under OpenAI's 300K tokens per request even then
+    embedding_max_tokens_per_request: int = int(os.getenv("EMBEDDING_MAX_TOKENS_PER_REQUEST", "100000"))
+    embedding_max_concurrency: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+    embedding_cache_size: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))  # ~6KB per 1536-d embedding, 0 disables
+    parallel_extraction_min_logs: int = int(os.getenv("PARALLEL_EXTRACTION_MIN_LOGS", "5000"))  # Below this, extract in-process
     analysis_model: str = os.getenv("ANALYSIS_MODEL", "gpt-4o-mini")
     top_n_similar_logs: int = int(os.getenv("TOP_N_SIMILAR_LOGS", "100"))
     max_logs_for_analysis: int = int(os.getenv("MAX_LOGS_FOR_ANALYSIS", "100"))
     max_returned_logs: int = int(os.getenv("MAX_RETURNED_LOGS", "20"))  # NEW: configurable max returned logs
+    debug_similarity: bool = os.getenv("DEBUG_SIMILARITY", "false").lower() == "true"  # Include _extracted_text in logs
 
     class Config:
         env_file = ".env"
@@ -1,13 +1,30 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.api.routes import router
+from app.services.log_analyzer import LogAnalyzer
+from app.services.openai_client import create_openai_client
 import uvicorn
 
 
+@asynccontextmanager
+async def lifespan(fastapi_app: FastAPI):
+    """Build the shared OpenAI client and services once per process"""
+    client = create_openai_client()
+    analyzer = LogAnalyzer(client)
+    fastapi_app.state.analyzer = analyzer
+    yield
+    analyzer.close()
+    await client.close()
+
+
 def create_app() -> FastAPI:
     fastapi_app = FastAPI(
         title="Log Analysis API",
         description="Analyze log files using semantic similarity and LLM analysis",
-        version="1.0.0"
+        version="1.0.0",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
     )
 
     # Include API routes
@@ -0,0 +1,40 @@
+import hashlib
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+import numpy as np
+
+
+class EmbeddingCache:
+    """Process-local LRU cache of normalized embeddings, keyed by a hash of the text"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        """Hash the text so the cache doesn't hold on to full log texts"""
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def get_many(self, texts: Iterable[str]) -> List[Optional[np.ndarray]]:
+        """Look up embeddings for texts, returning None for each cache miss"""
+        vectors = []
+        for text in texts:
+            key = self._key(text)
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)  # Mark as recently used
+            vectors.append(vector)
+        return vectors
+
+    def put_many(self, texts: Iterable[str], vectors: np.ndarray) -> None:
+        """Store embeddings for texts, evicting the least recently used entries when full"""
+        if self.max_size <= 0:
+            return
+
+        for text, vector in zip(texts, vectors):
+            # Copy the row so the cache doesn't keep the whole batch matrix alive
+            self._entries[self._key(text)] = vector.copy()
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -1,59 +1,121 @@
-from typing import List
-import openai
+import asyncio
+from typing import List, Tuple
+import numpy as np
 from fastapi import HTTPException
+from openai import AsyncOpenAI
 from app.config.settings import settings
 from app.config.costs import model_costs
+from app.services.embedding_cache import EmbeddingCache
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize each row of the matrix in place (zero rows are left as zeros)"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    matrix /= norms
+    return matrix
 
 
 class EmbeddingService:
-    def __init__(self):
-        openai.api_key = settings.openai_api_key
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
         self.model = settings.embedding_model
+        self.cache = EmbeddingCache(settings.embedding_cache_size)
+        # Shared by all requests, so the cap on in-flight embedding calls holds app-wide
+        self._request_semaphore = asyncio.Semaphore(settings.embedding_max_concurrency)
 
-    async def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for a single text"""
+    async def embed_with_cost(self, texts: List[str], batch_size: int = settings.embedding_batch_size) -> \
+            Tuple[np.ndarray, int, float]:
+        """
+        Get embeddings for multiple texts in batches, with the estimated token count and cost
+        of the texts actually sent to OpenAI.
+        Returns a contiguous (N, D) float32 matrix with L2-normalized rows,
+        so cosine similarity against it is a single matrix-vector product.
+        Identical texts and texts embedded by earlier requests are not sent to OpenAI again,
+        and tokens are counted while deduplicating and checking the cache, instead of in a separate pass.
+        """
         try:
-            response = await openai.Embedding.acreate(
-                model=self.model,
-                input=text
-            )
-            return response['data'][0]['embedding']
+            if not texts:
+                return np.empty((0, 0), dtype=np.float32), 0, 0.0
+
+            # Map every text to the row of its first occurrence
+            unique_rows = {}
+            row_indices = [unique_rows.setdefault(text, len(unique_rows)) for text in texts]
+
+            unique_embeddings, token_count = await self._get_unique_embeddings(list(unique_rows), batch_size)
+            cost = round(model_costs.calculate_embedding_cost(self.model, token_count), 6)
+            if len(unique_rows) == len(texts):
+                return unique_embeddings, token_count, cost
+
+            return unique_embeddings[row_indices], token_count, cost
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error getting embedding: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error getting batch embeddings: {str(e)}")
 
-    async def get_embeddings_batch(self, texts: List[str], batch_size: int = settings.embedding_batch_size) -> \
-            List[List[float]]:
-        """Get embeddings for multiple texts in batches"""
-        try:
-            all_embeddings = []
+    async def _get_unique_embeddings(self, texts: List[str], batch_size: int) -> Tuple[np.ndarray, int]:
+        """
+        Get embeddings for distinct texts, only fetching the ones missing from the cache.
+        Also returns the estimated token count of the fetched texts (cached texts cost nothing).
+        """
+        cached = self.cache.get_many(texts)
+        misses = [text for text, vector in zip(texts, cached) if vector is None]
+
+        if not misses:
+            return np.stack(cached), 0
 
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                response = await openai.Embedding.acreate(
+        token_count = model_costs.estimate_batch_token_count(misses)
+        fetched = await self._fetch_embeddings(misses, batch_size)
+        self.cache.put_many(misses, fetched)
+        if len(misses) == len(texts):
+            return fetched, token_count
+
+        # Fill the cache misses back in, preserving the original order
+        fetched_rows = iter(fetched)
+        return np.stack([vector if vector is not None else next(fetched_rows) for vector in cached]), token_count
+
+    async def _fetch_embeddings(self, texts: List[str], batch_size: int) -> np.ndarray:
+        """Request embeddings from OpenAI concurrently in batches and pack them into a normalized float32 matrix"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        async def embed_batch(batch: List[str]) -> np.ndarray:
+            # Bound in-flight requests to stay under the OpenAI rate limits
+            async with self._request_semaphore:
+                response = await self.client.embeddings.create(
                     model=self.model,
                     input=batch
                 )
-                batch_embeddings = [item['embedding'] for item in response['data']]
-                all_embeddings.extend(batch_embeddings)
+            return np.asarray([item.embedding for item in response.data], dtype=np.float32)
 
-            return all_embeddings
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error getting batch embeddings: {str(e)}")
+        tasks = [asyncio.ensure_future(embed_batch(batch)) for batch in self._split_batches(texts, batch_size)]
+        try:
+            batch_embeddings = await asyncio.gather(*tasks)
+        except BaseException:
+            # Don't leave the remaining batches running (and holding the semaphore) after a failure
+            for task in tasks:
+                task.cancel()
+            raise
 
-    def calculate_embedding_cost(self, texts: List[str], prompt: str = None) -> float:
-        """Calculate actual embedding cost based on text content using centralized costs"""
-        total_tokens = 0
+        return normalize_rows(np.concatenate(batch_embeddings))
 
-        # Count tokens for all log texts
-        for text in texts:
-            total_tokens += model_costs.estimate_token_count(text)
+    def _split_batches(self, texts: List[str], batch_size: int) -> List[List[str]]:
+        """Split texts into batches limited by both input count and estimated tokens per request"""
+        batches = []
+        batch = []
+        batch_tokens = 0
 
-        # Count tokens for prompt if provided
-        if prompt:
-            total_tokens += model_costs.estimate_token_count(prompt)
+        for text in texts:
+            tokens = model_costs.estimate_token_count(text)
+            if batch and (len(batch) >= batch_size or
+                          batch_tokens + tokens > settings.embedding_max_tokens_per_request):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
 
-        # Use centralized cost calculation
-        return round(model_costs.calculate_embedding_cost(self.model, total_tokens), 6)
+        if batch:
+            batches.append(batch)
+        return batches
 
     def estimate_embedding_cost(self, total_tokens: int) -> float:
         """Estimate cost for embeddings using centralized costs"""
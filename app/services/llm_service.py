@@ -1,39 +1,52 @@
-from typing import List, Dict, Any
-import openai
+from typing import List, Dict, Any, AsyncIterator
 from fastapi import HTTPException
+from openai import AsyncOpenAI
 from app.config.settings import settings
 from app.config.costs import model_costs
 
+SYSTEM_PROMPT = ("You are an expert log analyzer helping with incident investigation. "
+                 "Provide concise, actionable insights.")
+
+# Built once at import; only the incident prompt and log context vary per request
+ANALYSIS_PROMPT_TEMPLATE = """
+        Analyze the following logs for the incident: "{user_prompt}"
+
+        Logs (ordered by semantic relevance to the incident):
+        {log_context}
+
+        Please provide:
+        1. **Summary**: What's happening based on these logs?
+        2. **Root Cause**: Most likely cause of the incident
+        3. **Critical Logs**: Which specific log entries are most important?
+        4. **Recommended Actions**: What should be done to resolve this?
+
+        Be concise and focus on actionable insights. The logs are already filtered for relevance.
+        """
+
 
 class LLMService:
-    def __init__(self):
-        openai.api_key = settings.openai_api_key
+    # Common field names, checked in priority order
+    TIMESTAMP_FIELDS = ('timestamp', 'time', '@timestamp', 'date', 'datetime', 'created_at')
+    MESSAGE_FIELDS = ('message', 'msg', 'log', 'content', 'description', 'body')
+    SUMMARY_EXCLUDED_FIELDS = frozenset({'_similarity_score', '_extracted_text', 'timestamp', '@timestamp', 'time'})
+
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
         self.model = settings.analysis_model
 
     async def analyze_logs(self, logs: List[Dict[str, Any]], prompt: str) -> Dict[str, Any]:
         """Analyze filtered logs using LLM"""
         if not logs:
-            return {
-                "analysis": "No relevant logs found for the given prompt",
-                "cost": 0,
-                "logs_analyzed": 0
-            }
+            return self._no_logs_result()
 
         # Limit logs for cost control
         analysis_logs = logs[:settings.max_logs_for_analysis]
-
-        # Prepare context for LLM
-        log_context = self._prepare_flexible_log_context(analysis_logs)
-        analysis_prompt = self._create_analysis_prompt(prompt, log_context)
+        analysis_prompt = self._build_analysis_prompt(analysis_logs, prompt)
 
         try:
-            response = await openai.ChatCompletion.acreate(
+            response = await self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system",
-                     "content": "You are an expert log analyzer helping with incident investigation. Provide concise, actionable insights."},
-                    {"role": "user", "content": analysis_prompt}
-                ],
+                messages=self._create_messages(analysis_prompt),
                 max_tokens=1000,
                 temperature=0.1
             )
@@ -49,6 +62,69 @@ class LLMService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error analyzing logs with LLM: {str(e)}")
 
+    async def stream_analysis(self, logs: List[Dict[str, Any]], prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the LLM analysis as it is generated.
+        Yields {"delta": text} for each generated chunk, then {"result": ...} with the
+        same fields analyze_logs returns.
+        """
+        if not logs:
+            yield {"result": self._no_logs_result()}
+            return
+
+        # Limit logs for cost control
+        analysis_logs = logs[:settings.max_logs_for_analysis]
+        analysis_prompt = self._build_analysis_prompt(analysis_logs, prompt)
+
+        analysis_parts = []
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=self._create_messages(analysis_prompt),
+                max_tokens=1000,
+                temperature=0.1,
+                stream=True
+            )
+
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    analysis_parts.append(delta)
+                    yield {"delta": delta}
+
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error analyzing logs with LLM: {str(e)}")
+
+        # Cost is based on the full output, so it is only known once the stream ends
+        analysis = "".join(analysis_parts)
+        yield {
+            "result": {
+                "analysis": analysis,
+                "cost": self._calculate_analysis_cost(analysis_prompt, analysis),
+                "logs_analyzed": len(analysis_logs)
+            }
+        }
+
+    def _no_logs_result(self) -> Dict[str, Any]:
+        """Result returned when no logs are left to analyze"""
+        return {
+            "analysis": "No relevant logs found for the given prompt",
+            "cost": 0,
+            "logs_analyzed": 0
+        }
+
+    def _build_analysis_prompt(self, logs: List[Dict[str, Any]], prompt: str) -> str:
+        """Prepare the log context and wrap it in the analysis prompt"""
+        log_context = self._prepare_flexible_log_context(logs)
+        return self._create_analysis_prompt(prompt, log_context)
+
+    def _create_messages(self, analysis_prompt: str) -> List[Dict[str, str]]:
+        """Create the chat messages for the analysis request"""
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": analysis_prompt}
+        ]
+
     def _prepare_flexible_log_context(self, logs: List[Dict[str, Any]]) -> str:
         """Prepare log entries for LLM analysis - works with any log format"""
         log_lines = []
@@ -58,61 +134,40 @@ class LLMService:
 
             # Try to extract timestamp from common field names
             timestamp = self._extract_timestamp(log)
+            timestamp_part = f" [{timestamp}]" if timestamp else ""
 
-            # Try to extract main message/content
-            main_content = log
-
-            # Format for LLM
-            log_line = f"Log {i} (similarity: {similarity:.3f}):"
-            if timestamp:
-                log_line += f" [{timestamp}]"
-            log_line += f" complete_log: {main_content}"
-
-            log_lines.append(log_line)
+            # Format for LLM in a single string build (the complete log is the main content)
+            log_lines.append(f"Log {i} (similarity: {similarity:.3f}):{timestamp_part} complete_log: {log}")
 
         return "\n\n".join(log_lines)
 
     def _extract_timestamp(self, log: Dict[str, Any]) -> str:
         """Extract timestamp from various possible fields"""
-        timestamp_fields = ['timestamp', 'time', '@timestamp', 'date', 'datetime', 'created_at']
-        for field in timestamp_fields:
-            if field in log and log[field]:
-                return str(log[field])
+        for field in self.TIMESTAMP_FIELDS:
+            value = log.get(field)
+            if value:
+                return str(value)
         return ""
 
     def _extract_main_content(self, log: Dict[str, Any]) -> str:
         """Extract the main content/message from the log"""
         # Try message fields first
-        message_fields = ['message', 'msg', 'log', 'content', 'description', 'body']
-        for field in message_fields:
-            if field in log and log[field]:
-                return str(log[field])
+        for field in self.MESSAGE_FIELDS:
+            value = log.get(field)
+            if value:
+                return str(value)
 
         # If no message field, create a summary of key-value pairs
-        excluded_fields = {'_similarity_score', '_extracted_text', 'timestamp', '@timestamp', 'time'}
         parts = []
         for key, value in log.items():
-            if key not in excluded_fields and value and len(str(value)) < 100:
+            if key not in self.SUMMARY_EXCLUDED_FIELDS and value and len(str(value)) < 100:
                 parts.append(f"{key}={value}")
 
         return "; ".join(parts[:5])  # Limit to first 5 fields
 
     def _create_analysis_prompt(self, user_prompt: str, log_context: str) -> str:
         """Create the analysis prompt for the LLM"""
-        return f"""
-        Analyze the following logs for the incident: "{user_prompt}"
-
-        Logs (ordered by semantic relevance to the incident):
-        {log_context}
-
-        Please provide:
-        1. **Summary**: What's happening based on these logs?
-        2. **Root Cause**: Most likely cause of the incident
-        3. **Critical Logs**: Which specific log entries are most important?
-        4. **Recommended Actions**: What should be done to resolve this?
-
-        Be concise and focus on actionable insights. The logs are already filtered for relevance.
-        """
+        return ANALYSIS_PROMPT_TEMPLATE.format(user_prompt=user_prompt, log_context=log_context)
 
     def _calculate_analysis_cost(self, input_text: str, output_text: str) -> float:
         """Calculate cost for LLM analysis using centralized costs"""
@@ -1,88 +1,144 @@
+import asyncio
+import multiprocessing
+import os
+import re
 import time
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import List, Dict, Any, AsyncIterator, Tuple
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from openai import AsyncOpenAI
 from app.services.embedding_service import EmbeddingService
 from app.services.llm_service import LLMService
 from app.config.settings import settings
 
+# Common field names to prioritize (order matters for relevance), matched as substrings of flattened keys
+PRIORITY_FIELDS = (
+    'message', 'msg', 'log', 'content', 'description',
+    'error', 'exception', 'stacktrace', 'stack_trace',
+    'level', 'severity', 'priority',
+    'service', 'component', 'module', 'source',
+    'containerName', 'container_name', 'pod', 'podName',
+    'namespace', 'cluster', 'host', 'hostname',
+    'stream', 'logger', 'category', 'body'
+)
+
+# Substrings of field names that are likely IDs or timestamps (less useful for semantic search)
+ID_OR_TIMESTAMP_INDICATORS = ('id', 'uid', 'guid', 'uuid', 'hash', 'time', 'stamp', 'date')
+
+# Compiled once so each key is classified with a single regex search instead of a loop of substring checks
+PRIORITY_FIELD_RE = re.compile('|'.join(map(re.escape, PRIORITY_FIELDS)))
+ID_OR_TIMESTAMP_RE = re.compile('|'.join(map(re.escape, ID_OR_TIMESTAMP_INDICATORS)))
+
+
+@lru_cache(maxsize=4096)
+def _classify_key(key: str) -> Tuple[bool, bool]:
+    """
+    Classify a flattened log key as (priority field, likely ID or timestamp field).
+    The same key names repeat across thousands of logs, so results are memoized.
+    """
+    return (
+        PRIORITY_FIELD_RE.search(key) is not None,
+        ID_OR_TIMESTAMP_RE.search(key.lower()) is not None
+    )
+
 
 class LogAnalyzer:
-    def __init__(self):
-        self.embedding_service = EmbeddingService()
-        self.llm_service = LLMService()
+    def __init__(self, client: AsyncOpenAI):
+        self.embedding_service = EmbeddingService(client)
+        self.llm_service = LLMService(client)
+        self._extraction_executor = None  # Created on first large batch, reused across requests
+
+    def close(self) -> None:
+        """Shut down the text extraction worker processes, if any were started"""
+        if self._extraction_executor is not None:
+            self._extraction_executor.shutdown()
+            self._extraction_executor = None
 
-    def flatten_dict(self, d: dict, parent_key: str = '', sep: str = '.') -> dict:
+    @staticmethod
+    def flatten_dict(d: dict, parent_key: str = '', sep: str = '.') -> dict:
         """
-        Recursively flattens nested dicts into dot-notation keys.
+        Flattens nested dicts into dot-notation keys, keeping key order.
+        Uses an explicit stack of iterators instead of recursion.
         Example:
         {"a": {"b": 1}} -> {"a.b": 1}
         """
-        items = []
-        for k, v in d.items():
-            new_key = f"{parent_key}{sep}{k}" if parent_key else k
-            if isinstance(v, dict):
-                items.extend(self.flatten_dict(v, new_key, sep=sep).items())
+        flat = {}
+        stack = [(parent_key, iter(d.items()))]
+        while stack:
+            prefix, items = stack[-1]
+            for k, v in items:
+                new_key = f"{prefix}{sep}{k}" if prefix else k
+                if isinstance(v, dict):
+                    # Descend into the nested dict, then resume this one where we left off
+                    stack.append((new_key, iter(v.items())))
+                    break
+                flat[new_key] = v
             else:
-                items.append((new_key, v))
-        return dict(items)
+                stack.pop()
+        return flat
 
-    def extract_text_from_log(self, orig_log: Dict[str, Any]) -> str:
+    @staticmethod
+    def extract_text_from_log(orig_log: Dict[str, Any]) -> str:
         """
         Flexibly extract text from any log format for embedding.
         This function tries to intelligently combine all text fields.
         """
-        text_parts = []
-        text_parts_2 = []
-
-        log_attr = self.flatten_dict(orig_log)
-
-        # Common field names to prioritize (order matters for relevance)
-        priority_fields = [
-            'message', 'msg', 'log', 'content', 'description',
-            'error', 'exception', 'stacktrace', 'stack_trace',
-            'level', 'severity', 'priority',
-            'service', 'component', 'module', 'source',
-            'containerName', 'container_name', 'pod', 'podName',
-            'namespace', 'cluster', 'host', 'hostname',
-            'stream', 'logger', 'category', 'body'
-        ]
+        priority_parts = []
+        other_parts = []
 
-        included_log_attrs = dict()
+        log_attr = LogAnalyzer.flatten_dict(orig_log)
 
-        # First, add priority fields if they exist
+        # Single pass: priority fields go first, then the remaining fields (both in key order)
         for key, value in log_attr.items():
-            for field in priority_fields:
-                if key in included_log_attrs:
-                    break
-                if field in key and isinstance(value, (str, int, float)):
-                    text_parts.append(f"{key}:{str(value)}")
-                    included_log_attrs[key] = value
+            is_priority, is_id_or_timestamp = _classify_key(key)
+            if is_priority and isinstance(value, (str, int, float)):
+                priority_parts.append(f"{key}:{value}")
+            elif value and not is_id_or_timestamp:
+                other_parts.append(f"{key}:{value}")
 
-        un_included_log_attrs = {k: v for k, v in log_attr.items() if k not in included_log_attrs}
-
-        # Second, add non priority fields
-        for key, value in un_included_log_attrs.items():
-            for field in priority_fields:
-                if key in included_log_attrs:
-                    break
-                if value and field not in key and not self._is_id_or_timestamp_field(key):
-                    text_parts_2.append(f"{key}:{str(value)}")
-                    included_log_attrs[key] = value
-
-        text_parts.extend(text_parts_2)
+        text_parts = priority_parts + other_parts
 
         return ' | '.join(text_parts) if text_parts else str(log_attr)
 
-    def _is_id_or_timestamp_field(self, field_name: str) -> bool:
-        """Check if field is likely an ID or timestamp (less useful for semantic search)"""
-        id_indicators = ['id', 'uid', 'guid', 'uuid', 'hash', 'time', 'stamp', 'date']
-        return any(indicator in field_name.lower() for indicator in id_indicators)
-
     def prepare_log_texts(self, logs: List[Dict[str, Any]]) -> List[str]:
         """Prepare log entries for embedding by extracting meaningful text"""
         return [self.extract_text_from_log(log) for log in logs]
 
+    async def _prepare_log_texts_parallel(self, logs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Prepare log texts, spreading large batches across worker processes.
+        Text extraction is pure-Python CPU work, so threads wouldn't help (GIL).
+        """
+        workers = os.cpu_count() or 1
+        if workers < 2 or len(logs) < settings.parallel_extraction_min_logs:
+            return self.prepare_log_texts(logs)
+
+        if self._extraction_executor is None:
+            # Spawn rather than fork: by now the server has worker threads, and forking a threaded process can deadlock
+            self._extraction_executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        executor = self._extraction_executor
+
+        # One contiguous chunk per worker keeps the output in the original log order
+        chunk_size = -(-len(logs) // workers)
+        loop = asyncio.get_running_loop()
+        try:
+            chunks = await asyncio.gather(*(
+                loop.run_in_executor(executor, _extract_texts, logs[i:i + chunk_size])
+                for i in range(0, len(logs), chunk_size)
+            ))
+        except BrokenProcessPool:
+            # A worker died; drop the broken pool (a new one is started next time) and extract in-process
+            if self._extraction_executor is executor:
+                self._extraction_executor = None
+            executor.shutdown(wait=False)
+            return self.prepare_log_texts(logs)
+        return [text for chunk in chunks for text in chunk]
+
     async def filter_logs_by_similarity(
             self,
             logs: List[Dict[str, Any]],
@@ -96,38 +152,60 @@ class LogAnalyzer:
         top_n = top_n or settings.top_n_similar_logs
 
         # Prepare texts for embedding
-        log_texts = self.prepare_log_texts(logs)
-
-        embedding_cost = self.embedding_service.calculate_embedding_cost(log_texts, prompt)
+        log_texts = await self._prepare_log_texts_parallel(logs)
 
-        # Get embeddings
-        prompt_embedding = await self.embedding_service.get_embedding(prompt)
-        log_embeddings = await self.embedding_service.get_embeddings_batch(log_texts)
+        # Get embeddings for the prompt and logs together (one round trip instead of two),
+        # costing only the texts that actually had to be embedded
+        all_embeddings, _, embedding_cost = await self.embedding_service.embed_with_cost([prompt] + log_texts)
+        prompt_embedding = all_embeddings[0]
+        log_embeddings = all_embeddings[1:]
 
         # Calculate cosine similarity
         similarities = self._calculate_similarities(prompt_embedding, log_embeddings)
 
         # Get top N most similar logs
-        top_indices = np.argsort(similarities)[::-1][:top_n]
+        top_indices = self._top_n_indices(similarities, top_n)
 
         # Add similarity scores to logs and return
-        filtered_logs = []
-        for idx in top_indices:
-            log_with_score = logs[idx].copy()
-            log_with_score['_similarity_score'] = float(similarities[idx])
-            log_with_score['_extracted_text'] = log_texts[idx]  # For debugging
-            filtered_logs.append(log_with_score)
+        # (convert indices and scores to Python numbers in one call each, not per log)
+        top_scores = similarities[top_indices].tolist()
+        top_indices = top_indices.tolist()
+        filtered_logs = [
+            {**logs[idx], '_similarity_score': score}
+            for idx, score in zip(top_indices, top_scores)
+        ]
+
+        # Only attach the embedded text when debugging, it roughly doubles each log's size
+        if settings.debug_similarity:
+            for log_with_score, idx in zip(filtered_logs, top_indices):
+                log_with_score['_extracted_text'] = log_texts[idx]
 
         return filtered_logs, embedding_cost
 
-    def _calculate_similarities(self, prompt_embedding: List[float], log_embeddings: List[List[float]]) -> np.ndarray:
-        """Calculate cosine similarity between prompt and log embeddings"""
-        prompt_embedding_array = np.array(prompt_embedding).reshape(1, -1)
-        # converts array to 2d array for cosine comparison
-        log_embeddings_array = np.array(log_embeddings)  # already a 2d array
+    def _top_n_indices(self, similarities: np.ndarray, top_n: int) -> np.ndarray:
+        """
+        Indices of the top_n highest similarities, most similar first.
+        Partitions in O(N) and only sorts the selected top_n, instead of sorting every log.
+        """
+        if top_n < len(similarities):
+            candidates = np.argpartition(similarities, -top_n)[-top_n:]
+        else:
+            candidates = np.arange(len(similarities))
+        return candidates[np.argsort(similarities[candidates])[::-1]]
+
+    def _calculate_similarities(self, prompt_embedding: List[float], log_embeddings: np.ndarray) -> np.ndarray:
+        """Calculate cosine similarity between prompt and L2-normalized log embeddings"""
+        # L2-normalize the prompt vector (a single dot product, no temporary matrix)
+        prompt_vec = np.asarray(prompt_embedding, dtype=np.float32)
+        prompt_norm = np.sqrt(np.vdot(prompt_vec, prompt_vec))
+        if prompt_norm > 0:
+            prompt_vec = prompt_vec / prompt_norm
 
-        similarities = cosine_similarity(prompt_embedding_array, log_embeddings_array)[0]
-        return similarities
+        # BLAS sgemv needs a C-contiguous float32 matrix (no copy when it already is one)
+        log_embeddings = np.ascontiguousarray(log_embeddings, dtype=np.float32)
+
+        # rows are already unit length, so cosine similarity is a single matrix-vector product
+        return log_embeddings @ prompt_vec
 
     async def analyze_logs(self, logs: List[Dict[str, Any]], prompt: str) -> Dict[str, Any]:
         """Complete log analysis pipeline with detailed timing"""
@@ -142,6 +220,41 @@ class LogAnalyzer:
         llm_result = await self.llm_service.analyze_logs(filtered_logs, prompt)
         llm_time = time.time() - llm_start
 
+        return self._build_result(logs, filtered_logs, embedding_cost, llm_result, filter_time, llm_time)
+
+    async def analyze_logs_stream(self, logs: List[Dict[str, Any]], prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same pipeline as analyze_logs, but streams the LLM analysis.
+        Yields {"delta": text} as the analysis is generated, then {"result": ...} with the
+        same fields analyze_logs returns.
+        """
+        # Time the filtering stage
+        filter_start = time.time()
+        filtered_logs, embedding_cost = await self.filter_logs_by_similarity(logs, prompt)
+        filter_time = time.time() - filter_start
+
+        # Time the LLM analysis stage, forwarding tokens as they arrive
+        llm_start = time.time()
+        llm_result = None
+        async for event in self.llm_service.stream_analysis(filtered_logs, prompt):
+            if "delta" in event:
+                yield event
+            else:
+                llm_result = event["result"]
+        llm_time = time.time() - llm_start
+
+        yield {"result": self._build_result(logs, filtered_logs, embedding_cost, llm_result, filter_time, llm_time)}
+
+    def _build_result(
+            self,
+            logs: List[Dict[str, Any]],
+            filtered_logs: List[Dict[str, Any]],
+            embedding_cost: float,
+            llm_result: Dict[str, Any],
+            filter_time: float,
+            llm_time: float
+    ) -> Dict[str, Any]:
+        """Combine filtering and LLM results into the analysis summary"""
         # Calculate total cost (embedding + LLM)
         total_cost = embedding_cost + llm_result["cost"]
 
@@ -160,3 +273,8 @@ class LogAnalyzer:
                 "llm_analysis_seconds": round(llm_time, 3)
             }
         }
+
+
+def _extract_texts(logs: List[Dict[str, Any]]) -> List[str]:
+    """Extract embedding texts for a chunk of logs (module-level so worker processes can run it)"""
+    return [LogAnalyzer.extract_text_from_log(log) for log in logs]
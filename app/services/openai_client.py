@@ -0,0 +1,14 @@
+from openai import AsyncOpenAI
+from app.config.settings import settings
+
+
+def create_openai_client() -> AsyncOpenAI:
+    """
+    Create the OpenAI client shared by all services.
+    Built once at app startup so all requests reuse the same pooled HTTP connections.
+    """
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        max_retries=settings.openai_max_retries,
+        timeout=settings.openai_timeout_seconds
+    )
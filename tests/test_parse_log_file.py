@@ -0,0 +1,68 @@
+import asyncio
+import io
+
+import orjson
+from starlette.datastructures import Headers, UploadFile
+
+from app.api.routes import UPLOAD_CHUNK_SIZE, _parse_log_file
+
+JSONL = b'{"level": "error", "message": "a"}\n{"level": "info", "message": "b"}\n{"level": "warn", "message": "c"}\n'
+
+
+def _parse(content: bytes, filename: str, content_type: str = "application/octet-stream"):
+    upload = UploadFile(io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+    return asyncio.run(_parse_log_file(upload))
+
+
+def test_jsonl():
+    assert [log["message"] for log in _parse(JSONL, "logs.jsonl")] == ["a", "b", "c"]
+
+
+def test_jsonl_named_json_falls_back_to_lines():
+    assert [log["message"] for log in _parse(JSONL, "logs.json")] == ["a", "b", "c"]
+
+
+def test_jsonl_sent_as_application_json_falls_back_to_lines():
+    assert [log["message"] for log in _parse(JSONL, "logs.jsonl", "application/json")] == ["a", "b", "c"]
+
+
+def test_json_array():
+    assert _parse(b'[\n  {"message": "a"},\n  {"message": "b"}\n]', "logs.txt") == [{"message": "a"}, {"message": "b"}]
+
+
+def test_small_pretty_printed_object():
+    assert _parse(b'{\n  "a": {\n    "b": 1\n  }\n}\n', "logs.log") == [{"a": {"b": 1}}]
+
+
+def test_pretty_printed_object_larger_than_one_chunk():
+    log = {"message": "x" * 100, "items": [f"item-{i}" for i in range(UPLOAD_CHUNK_SIZE // 10)]}
+    content = orjson.dumps(log, option=orjson.OPT_INDENT_2)
+    assert len(content) > UPLOAD_CHUNK_SIZE
+
+    assert _parse(content, "logs.log") == [log]
+
+
+def test_jsonl_spanning_chunks():
+    line = orjson.dumps({"message": "y" * 1000}) + b"\n"
+    count = UPLOAD_CHUNK_SIZE // len(line) * 2 + 1
+    logs = _parse(line * count, "logs.jsonl")
+
+    assert len(logs) == count
+
+
+def test_malformed_lines_are_skipped():
+    assert _parse(b'{"message": "a"}\nnot json\n{"message": "b"}', "logs.jsonl") == [
+        {"message": "a"}, {"message": "b"}
+    ]
+
+
+def test_jsonl_with_malformed_first_line():
+    assert _parse(b'{"message": \n' + JSONL, "logs.log") == _parse(JSONL, "logs.log")
+
+
+def test_non_finite_numbers_are_skipped():
+    assert _parse(b'{"v": NaN}\n{"v": Infinity}\n{"message": "a"}\n', "logs.jsonl") == [{"message": "a"}]
+
+
+def test_integers_wider_than_64_bits_become_floats():
+    assert _parse(b'{"v": 18446744073709551616}\n', "logs.jsonl") == [{"v": 2.0 ** 64}]